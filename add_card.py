@@ -11,7 +11,7 @@ import json
 import os
 import sys
 
-from german_anki_generator import save_word_info
+from german_anki_generator import read_word_list, save_word_info
 
 ADDED_WORDS_FILE = 'added_words.txt'
 VALID_WORD_TYPES = {'noun', 'verb', 'adjective', 'adverb', 'phrase', 'conjunction', 'preposition', 'other'}
@@ -19,9 +19,8 @@ VALID_WORD_TYPES = {'noun', 'verb', 'adjective', 'adverb', 'phrase', 'conjunctio
 
 def load_existing_words():
     if not os.path.exists(ADDED_WORDS_FILE):
-        return set()
-    with open(ADDED_WORDS_FILE, encoding='utf-8') as f:
-        return {line.strip() for line in f if line.strip() and not line.startswith('#')}
+        return frozenset()
+    return frozenset(read_word_list(ADDED_WORDS_FILE))
 
 
 def main():
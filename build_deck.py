@@ -13,9 +13,11 @@ Examples:
   python build_deck.py --mode cloze    --words-file cloze_30.txt    --deck-name "German Cloze"     --output german_cloze.apkg
 """
 import argparse
-import random
+import asyncio
+import sys
 
 import genanki
+import gtts
 
 from german_anki_generator import (
     create_anki_model,
@@ -24,12 +26,44 @@ from german_anki_generator import (
     create_cards,
     create_cloze_cards,
     create_sentence_cards,
+    deck_id_for,
     export_deck,
     load_all_word_infos,
     load_word_infos_for,
 )
 
 AUDIO_DIR = 'audio'
+MAX_CONCURRENT_WORDS = 10  # words whose audio is being generated at once
+
+
+def _create_fact_cards(word_info, model, deck, audio_dir):
+    audio_files, _ = create_cards(word_info, model, deck, audio_dir)
+    return audio_files
+
+
+async def _build_notes(word_infos, create_fn, model, deck_id, deck_name):
+    """Run create_fn for every word concurrently.
+
+    Returns (notes, audio_files) per word, in input order — or the exception if that word failed.
+    Once one word's text-to-speech fails the deck won't be written, so words not yet started
+    are not attempted and give None.
+    """
+    sem = asyncio.Semaphore(MAX_CONCURRENT_WORDS)
+    tts_failed = asyncio.Event()
+
+    async def bounded(word_info):
+        async with sem:
+            if tts_failed.is_set():
+                return None
+            word_deck = genanki.Deck(deck_id, deck_name)
+            try:
+                audio_files = await asyncio.to_thread(create_fn, word_info, model, word_deck, AUDIO_DIR)
+            except gtts.gTTSError:
+                tts_failed.set()
+                raise
+            return word_deck.notes, audio_files
+
+    return await asyncio.gather(*(bounded(word_info) for word_info in word_infos), return_exceptions=True)
 
 
 def build_deck(mode='fact', deck_name='German Vocabulary', output_file=None, words_file=None):
@@ -43,31 +77,66 @@ def build_deck(mode='fact', deck_name='German Vocabulary', output_file=None, wor
 
     if not word_infos:
         print('No card data found. Run the generator first.')
-        return
+        return False
 
-    deck_id = random.randrange(1 << 30, 1 << 31)
+    deck_id = deck_id_for(deck_name)
     deck = genanki.Deck(deck_id, deck_name)
 
     if mode == 'fact':
         model = create_anki_model()
-        for word_info in word_infos:
-            create_cards(word_info, model, deck, AUDIO_DIR)
+        create_fn = _create_fact_cards
 
     elif mode == 'sentence':
         model = create_sentence_model()
-        for word_info in word_infos:
-            create_sentence_cards(word_info, model, deck, AUDIO_DIR)
+        create_fn = create_sentence_cards
 
     elif mode == 'cloze':
         model = create_cloze_model()
+        create_fn = create_cloze_cards
+        with_cloze = []
         for word_info in word_infos:
             if not word_info.get('cloze_sentences'):
                 print(f'  Warning: no cloze_sentences for "{word_info["canonical"]}", skipping.')
                 continue
-            create_cloze_cards(word_info, model, deck, AUDIO_DIR)
-
-    export_deck(deck, output_file, AUDIO_DIR)
+            with_cloze.append(word_info)
+        word_infos = with_cloze
+
+    # Each word's audio is a few gTTS round-trips; fetch them for many words at once,
+    # then add the notes to the deck in the original order.
+    media_files = []
+    failed_words = []
+    not_attempted = 0
+    results = asyncio.run(_build_notes(word_infos, create_fn, model, deck_id, deck_name))
+    for word_info, result in zip(word_infos, results):
+        if result is None:
+            not_attempted += 1
+            continue
+        # Only TTS failures are worth a re-run; bad card data, disk errors or bugs stop the build
+        if isinstance(result, gtts.gTTSError):
+            print(f'  Error: could not build "{word_info["canonical"]}": {result}')
+            failed_words.append(word_info['canonical'])
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        notes, audio_files = result
+        for note in notes:
+            deck.add_note(note)
+        media_files.extend(audio_files)
+
+    # Keep the last good deck rather than replacing it with one that is missing words
+    if failed_words:
+        print(f'Text-to-speech failed for {len(failed_words)} word(s): {", ".join(failed_words)}')
+        if not_attempted:
+            print(f'Stopped early; {not_attempted} word(s) not attempted.')
+        print(f'{output_file} left unchanged — re-run to retry.')
+        return False
+    if not deck.notes:
+        print(f'No cards built; {output_file} left unchanged.')
+        return False
+
+    export_deck(deck, output_file, media_files)
     print(f'Built {len(deck.notes)} cards → {output_file}')
+    return True
 
 
 if __name__ == '__main__':
@@ -84,9 +153,10 @@ if __name__ == '__main__':
         'cloze': 'German Cloze',
     }[args.mode]
 
-    build_deck(
+    if not build_deck(
         mode=args.mode,
         deck_name=deck_name,
         output_file=args.output,
         words_file=args.words_file,
-    )
+    ):
+        sys.exit(1)
@@ -1,13 +1,18 @@
 import hashlib
 import json
 import os
+import random
 import re
+import shutil
 import sys
-
-import genanki
-import gtts
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 CARD_DATA_DIR = 'card_data'
+TTS_CACHE_DIR = '.tts_cache'  # one mp3 per distinct sentence, named by its hash
+TTS_MAX_ATTEMPTS = 4
+TTS_MAX_BACKOFF = 30  # seconds
 
 ANKI_MODEL_ID = 1738291047  # Fixed — Anki uses this to identify the model across imports
 
@@ -64,6 +69,8 @@ _CSS = '''.card {
 
 
 def create_anki_model():
+    import genanki
+
     return genanki.Model(
         ANKI_MODEL_ID,
         'German Vocabulary',
@@ -97,14 +104,79 @@ def create_anki_model():
     )
 
 
+def deck_id_for(deck_name):
+    """Deck ID derived from the name, so a rebuilt deck merges into the one already in Anki."""
+    h = int(hashlib.md5(deck_name.encode()).hexdigest()[:8], 16)
+    return (1 << 30) | (h & ((1 << 30) - 1))
+
+
+def _save_tts(text, cache_path):
+    import gtts
 
-def generate_audio(text, filename):
-    if not os.path.exists(filename):
-        tts = gtts.gTTS(text, lang='de')
-        tts.save(filename)
+    # Write then rename, so a parallel build never copies a half-written file.
+    # Plain open(), not tempfile: its 0600 mode would carry over to the audio/ hard links.
+    tmp_path = f'{cache_path}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            gtts.gTTS(text, lang='de').write_to_fp(f)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, cache_path)
+
+
+def _is_transient_tts_error(error):
+    """Rate limiting (429) or a server error. Connection failures and other 4xx won't fix themselves."""
+    rsp = error.rsp
+    return rsp is not None and (rsp.status_code == 429 or rsp.status_code >= 500)
+
+
+def generate_audio(text, filename, cache_dir=TTS_CACHE_DIR):
+    """Write German TTS of text to filename, reusing the cached mp3 if this text was spoken before."""
+    import gtts
+
+    if os.path.exists(filename):
+        return filename
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, hashlib.md5(text.encode()).hexdigest() + '.mp3')
+    if not os.path.exists(cache_path):
+        for attempt in range(1, TTS_MAX_ATTEMPTS + 1):
+            try:
+                _save_tts(text, cache_path)
+                break
+            except gtts.gTTSError as e:
+                if attempt == TTS_MAX_ATTEMPTS or not _is_transient_tts_error(e):
+                    raise
+                # Google answers bursts with 429s; back off 1s, 2s, 4s... plus jitter
+                time.sleep(min(2 ** (attempt - 1), TTS_MAX_BACKOFF) + random.uniform(0, 1))
+    # Hard link, so audio/ doesn't hold a second copy of every cached mp3
+    try:
+        os.link(cache_path, filename)
+    except FileExistsError:
+        pass  # a parallel build just created the same file
+    except OSError:
+        shutil.copyfile(cache_path, filename)  # e.g. audio/ on another filesystem
     return filename
 
 
+# gTTS is one blocking HTTP request per file; shared so concurrent card builds share the cap
+_AUDIO_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+
+def _generate_audio_all(jobs):
+    """Generate audio for a list of (text, filename) pairs in parallel."""
+    return list(_AUDIO_EXECUTOR.map(lambda job: generate_audio(*job), jobs))
+
+
+_AUDIO_NAME_TABLE = str.maketrans({c: '_' for c in ' /\\:?*"<>|'})
+
+
+def _word_audio_filename(canonical):
+    """'Angst haben' → 'angst_haben_<hash>_word.mp3'; the hash keeps e.g. 'Arm' and 'arm' apart."""
+    h = hashlib.md5(canonical.encode()).hexdigest()[:6]
+    return f'{canonical.lower().translate(_AUDIO_NAME_TABLE)}_{h}_word.mp3'
+
+
 def _safe_filename(canonical):
     return re.sub(r'[^a-z0-9äöüß]', '_', canonical.lower()) + '.json'
 
@@ -119,38 +191,51 @@ def save_word_info(word_info, card_data_dir=CARD_DATA_DIR):
 def load_all_word_infos(card_data_dir=CARD_DATA_DIR):
     if not os.path.exists(card_data_dir):
         return []
+    with os.scandir(card_data_dir) as it:
+        paths = sorted(e.path for e in it if e.is_file() and e.name.endswith('.json'))
     infos = []
-    for filename in sorted(os.listdir(card_data_dir)):
-        if filename.endswith('.json'):
-            with open(os.path.join(card_data_dir, filename), encoding='utf-8') as f:
-                infos.append(json.load(f))
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            infos.append(json.load(f))
     return infos
 
 
+def _adopt_legacy_audio(legacy_path, path):
+    """Rename an mp3 saved under its pre-hash name to its current name, so upgrading doesn't re-fetch it."""
+    if os.path.exists(legacy_path) and not os.path.exists(path):
+        os.replace(legacy_path, path)
+
+
 def _build_note(canonical, english, word_info, model, audio_dir, sentences_key='sentences'):
     """Build a single genanki.Note with word audio + example audio. Returns (note, audio_files)."""
+    import genanki
+
     word_type = word_info['word_type']
 
     audio_text = canonical
 
-    safe_name = canonical.lower().replace(' ', '_')
-    word_audio_path = os.path.join(audio_dir, f'{safe_name}_word.mp3')
-    generate_audio(audio_text, word_audio_path)
-    audio_files = [word_audio_path]
+    legacy_name = canonical.lower().replace(' ', '_')  # audio naming before it was hash-keyed
+
+    word_audio_path = os.path.join(audio_dir, _word_audio_filename(canonical))
+    _adopt_legacy_audio(os.path.join(audio_dir, f'{legacy_name}_word.mp3'), word_audio_path)
+    audio_jobs = [(audio_text, word_audio_path)]
 
     word_audio_tag = f'[sound:{os.path.basename(word_audio_path)}]'
 
     sentences = word_info.get(sentences_key, [])
     formatted_examples = []
     for i, sentence in enumerate(sentences, 1):
-        ex_path = os.path.join(audio_dir, f'{safe_name}_ex{i}.mp3')
-        generate_audio(sentence['german'], ex_path)
-        audio_files.append(ex_path)
+        # Same name as the sentence deck uses, so Anki stores the file once across decks
+        h = hashlib.md5(sentence['german'].encode()).hexdigest()[:8]
+        ex_path = os.path.join(audio_dir, f'sent_{h}.mp3')
+        _adopt_legacy_audio(os.path.join(audio_dir, f'{legacy_name}_ex{i}.mp3'), ex_path)
+        audio_jobs.append((sentence['german'], ex_path))
         audio_tag = f'[sound:{os.path.basename(ex_path)}]'
         formatted_examples.append(
             f'<b>{i}. {sentence["german"]}</b> {audio_tag}<br><i>{sentence["english"]}</i>'
         )
     examples_html = '<br><br>'.join(formatted_examples)
+    audio_files = _generate_audio_all(audio_jobs)
 
     prepositions = word_info.get('prepositions') or []
     prepositions_str = ' · '.join(prepositions) if isinstance(prepositions, list) else str(prepositions)
@@ -212,32 +297,32 @@ def create_cards(word_info, model, deck, audio_dir):
     return all_audio, canonicals
 
 
+def read_word_list(filename):
+    """Non-empty, non-comment lines of a word list file. Raises OSError/UnicodeDecodeError on failure."""
+    with open(filename, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    return [w for w in (line.strip() for line in lines) if w and not w.startswith('#')]
+
+
 def read_words_from_file(filename):
-    words = []
+    """read_word_list for command-line use: prints the problem and exits instead of raising."""
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                word = line.strip()
-                if word and not word.startswith('#'):
-                    words.append(word)
+        return read_word_list(filename)
     except FileNotFoundError:
         print(f"Error: File '{filename}' not found.")
         sys.exit(1)
     except Exception as e:
         print(f"Error reading file '{filename}': {e}")
         sys.exit(1)
-    return words
 
 
-def export_deck(deck, output_filename, audio_dir):
-    media_files = []
-    if os.path.exists(audio_dir):
-        for file in os.listdir(audio_dir):
-            if file.endswith('.mp3'):
-                media_files.append(os.path.join(audio_dir, file))
+def export_deck(deck, output_filename, media_files):
+    """Write deck to an .apkg with media_files (the audio returned by the create_*cards calls)."""
+    import genanki
 
     package = genanki.Package(deck)
-    package.media_files = media_files
+    # Words can share a sentence (and so an mp3); write each file into the zip once
+    package.media_files = list(dict.fromkeys(media_files))
     package.write_to_file(output_filename)
     print(f"Deck exported as {output_filename}")
 
@@ -252,6 +337,8 @@ _SENTENCE_CSS = _CSS + '\n.hint { color: #999; font-size: 14px; margin-top: 10px
 
 
 def create_sentence_model():
+    import genanki
+
     return genanki.Model(
         SENTENCE_MODEL_ID,
         'German Sentence',
@@ -277,17 +364,18 @@ def create_sentence_model():
 
 def create_sentence_cards(word_info, model, deck, audio_dir):
     """One card per example sentence: English front → German back + audio."""
+    import genanki
+
     os.makedirs(audio_dir, exist_ok=True)
     canonical = word_info['canonical']
-    all_audio = []
+    audio_jobs = []
 
     def _add(sentence, hint):
         german = sentence['german']
         english = sentence['english']
         h = hashlib.md5(german.encode()).hexdigest()[:8]
         audio_path = os.path.join(audio_dir, f'sent_{h}.mp3')
-        generate_audio(german, audio_path)
-        all_audio.append(audio_path)
+        audio_jobs.append((german, audio_path))
         note = genanki.Note(
             model=model,
             guid=genanki.guid_for(f'sent:{german}'),
@@ -303,7 +391,7 @@ def create_sentence_cards(word_info, model, deck, audio_dir):
         for sentence in word_info.get('non_reflexive_sentences', []):
             _add(sentence, nr_canonical)
 
-    return all_audio
+    return _generate_audio_all(audio_jobs)
 
 
 # ---------------------------------------------------------------------------
@@ -314,6 +402,8 @@ CLOZE_MODEL_ID_CUSTOM = 1738291049
 
 
 def create_cloze_model():
+    import genanki
+
     return genanki.Model(
         CLOZE_MODEL_ID_CUSTOM,
         'German Cloze',
@@ -344,8 +434,10 @@ def _strip_cloze_markers(text):
 
 def create_cloze_cards(word_info, model, deck, audio_dir):
     """One Anki cloze note per sentence, each with its own English hint."""
+    import genanki
+
     os.makedirs(audio_dir, exist_ok=True)
-    all_audio = []
+    audio_jobs = []
 
     def _add_sentences(sentences, word_hint):
         for item in sentences:
@@ -355,8 +447,7 @@ def create_cloze_cards(word_info, model, deck, audio_dir):
             clean = _strip_cloze_markers(text)
             h = hashlib.md5(clean.encode()).hexdigest()[:8]
             audio_path = os.path.join(audio_dir, f'cloze_{h}.mp3')
-            generate_audio(clean, audio_path)
-            all_audio.append(audio_path)
+            audio_jobs.append((clean, audio_path))
             note = genanki.Note(
                 model=model,
                 guid=genanki.guid_for(f'cloze:{word_hint}:{clean}'),
@@ -373,7 +464,7 @@ def create_cloze_cards(word_info, model, deck, audio_dir):
     if word_info.get('also_non_reflexive') and nr_canonical and nr_canonical != word_info['canonical'] and nr_sentences:
         _add_sentences(nr_sentences, nr_canonical)
 
-    return all_audio
+    return _generate_audio_all(audio_jobs)
 
 
 # ---------------------------------------------------------------------------
@@ -382,10 +473,8 @@ def create_cloze_cards(word_info, model, deck, audio_dir):
 
 def load_word_infos_for(words_file, card_data_dir=CARD_DATA_DIR):
     """Load word_info dicts for the canonicals listed in words_file."""
-    with open(words_file, encoding='utf-8') as f:
-        canonicals = [line.strip() for line in f if line.strip() and not line.startswith('#')]
     infos = []
-    for canonical in canonicals:
+    for canonical in read_word_list(words_file):
         path = os.path.join(card_data_dir, _safe_filename(canonical))
         if os.path.exists(path):
             with open(path, encoding='utf-8') as f:
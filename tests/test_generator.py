@@ -1,21 +1,37 @@
 """Automated tests using a mocked Anthropic client."""
 
+import hashlib
+import os
 import tempfile
+import time
+import zipfile
+from types import SimpleNamespace
 from unittest.mock import patch
 
 import genanki
+import gtts
+import pytest
 
+from build_deck import build_deck
 from german_anki_generator import (
     ANKI_MODEL_ID,
     SENTENCE_MODEL_ID,
     CLOZE_MODEL_ID_CUSTOM,
+    TTS_MAX_ATTEMPTS,
     create_anki_model,
     create_sentence_model,
     create_cloze_model,
     create_cards,
     create_sentence_cards,
     create_cloze_cards,
+    deck_id_for,
+    export_deck,
+    generate_audio,
+    load_word_infos_for,
+    read_word_list,
+    save_word_info,
     _strip_cloze_markers,
+    _word_audio_filename,
 )
 
 # ---------------------------------------------------------------------------
@@ -130,6 +146,17 @@ def make_deck():
     return genanki.Deck(99999, 'Test')
 
 
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def word_audio_text(mock_audio):
+    """Text passed to generate_audio for the word audio (calls run in parallel, so order isn't fixed)."""
+    [text] = [c.args[0] for c in mock_audio.call_args_list if c.args[1].endswith('_word.mp3')]
+    return text
+
+
 # Field index constants
 F_GERMAN_FRONT = 0
 F_WORD_AUDIO = 1
@@ -180,8 +207,7 @@ class TestCreateCardsNoun:
         deck = make_deck()
         with tempfile.TemporaryDirectory() as tmpdir:
             create_cards(NOUN_INFO, model, deck, tmpdir)
-        first_call_text = mock_audio.call_args_list[0].args[0]
-        assert first_call_text == 'Hund'
+        assert word_audio_text(mock_audio) == 'Hund'
 
     @patch('german_anki_generator.generate_audio')
     def test_noun_examples_in_html(self, mock_audio):
@@ -226,8 +252,7 @@ class TestCreateCardsVerb:
         deck = make_deck()
         with tempfile.TemporaryDirectory() as tmpdir:
             create_cards(VERB_INFO, model, deck, tmpdir)
-        first_call_text = mock_audio.call_args_list[0].args[0]
-        assert first_call_text == 'drehen'
+        assert word_audio_text(mock_audio) == 'drehen'
 
     @patch('german_anki_generator.generate_audio')
     def test_verb_null_case_becomes_empty(self, mock_audio):
@@ -244,8 +269,7 @@ class TestCreateCardsVerb:
         deck = make_deck()
         with tempfile.TemporaryDirectory() as tmpdir:
             create_cards(REFLEXIVE_ONLY_INFO, model, deck, tmpdir)
-        first_call_text = mock_audio.call_args_list[0].args[0]
-        assert first_call_text == 'sich freuen'
+        assert word_audio_text(mock_audio) == 'sich freuen'
 
 
 class TestCreateCardsDualReflexive:
@@ -338,6 +362,200 @@ class TestCreateCardsPhrase:
         assert note.fields[F_PERFEKT] == ''
 
 
+# ---------------------------------------------------------------------------
+# Audio files and export
+# ---------------------------------------------------------------------------
+
+class TestCreateCardsAudio:
+    @patch('german_anki_generator.generate_audio')
+    def test_audio_files_in_job_order(self, mock_audio):
+        """Audio is generated in parallel but returned in word, example 1, example 2... order."""
+        mock_audio.side_effect = lambda text, filename: filename
+        model = create_anki_model()
+        deck = make_deck()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            audio_files, _ = create_cards(VERB_INFO, model, deck, tmpdir)
+        expected = [_word_audio_filename('drehen')] + [
+            f'sent_{hashlib.md5(s["german"].encode()).hexdigest()[:8]}.mp3' for s in VERB_INFO['sentences']
+        ]
+        assert [os.path.basename(f) for f in audio_files] == expected
+
+    @patch('german_anki_generator.generate_audio')
+    def test_example_audio_shared_with_sentence_deck(self, mock_audio):
+        mock_audio.side_effect = lambda text, filename: filename
+        deck = make_deck()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fact_audio, _ = create_cards(NOUN_INFO, create_anki_model(), deck, tmpdir)
+            sentence_audio = create_sentence_cards(NOUN_INFO, create_sentence_model(), deck, tmpdir)
+        assert fact_audio[1:] == sentence_audio
+
+
+    @patch('german_anki_generator.generate_audio')
+    def test_legacy_example_audio_renamed(self, mock_audio):
+        """Decks built before hash-keyed names keep their example audio instead of re-fetching it."""
+        mock_audio.side_effect = lambda text, filename: filename
+        with tempfile.TemporaryDirectory() as tmpdir:
+            legacy = os.path.join(tmpdir, 'hund_ex1.mp3')
+            with open(legacy, 'wb') as f:
+                f.write(b'old')
+            audio_files, _ = create_cards(NOUN_INFO, create_anki_model(), make_deck(), tmpdir)
+            assert not os.path.exists(legacy)
+            assert read_bytes(audio_files[1]) == b'old'
+
+
+    @patch('german_anki_generator.generate_audio')
+    def test_legacy_word_audio_renamed(self, mock_audio):
+        mock_audio.side_effect = lambda text, filename: filename
+        with tempfile.TemporaryDirectory() as tmpdir:
+            legacy = os.path.join(tmpdir, 'angst_haben_word.mp3')
+            with open(legacy, 'wb') as f:
+                f.write(b'old')
+            audio_files, _ = create_cards(PHRASE_INFO, create_anki_model(), make_deck(), tmpdir)
+            assert not os.path.exists(legacy)
+            assert os.path.basename(audio_files[0]) == _word_audio_filename('Angst haben')
+            assert read_bytes(audio_files[0]) == b'old'
+
+
+class TestWordAudioFilename:
+    def test_spaces_become_underscores(self):
+        assert _word_audio_filename('Angst haben').startswith('angst_haben_')
+
+    def test_unsafe_characters_replaced(self):
+        name = _word_audio_filename('und/oder: was?')
+        assert not any(c in name for c in ' /:?')
+
+    def test_case_variants_do_not_collide(self):
+        assert _word_audio_filename('Arm') != _word_audio_filename('arm')
+
+
+@pytest.fixture
+def fake_tts():
+    """Patch gtts.gTTS with a fake that 'speaks' the text as its UTF-8 bytes.
+
+    The returned state records each text in .calls; errors queued in .errors are raised first.
+    """
+    state = SimpleNamespace(calls=[], errors=[])
+
+    class FakeTTS:
+        def __init__(self, text, lang):
+            state.calls.append(text)
+            self.text = text
+
+        def write_to_fp(self, fp):
+            if state.errors:
+                raise state.errors.pop(0)
+            fp.write(self.text.encode())
+
+    with patch('gtts.gTTS', FakeTTS):
+        yield state
+
+
+def tts_http_error(status_code):
+    return gtts.gTTSError(f'{status_code} from Google', response=SimpleNamespace(status_code=status_code))
+
+
+class TestGenerateAudio:
+    def test_writes_file(self, fake_tts):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out = os.path.join(tmpdir, 'a.mp3')
+            generate_audio('Der Hund bellt.', out, cache_dir=os.path.join(tmpdir, 'cache'))
+            assert read_bytes(out) == b'Der Hund bellt.'
+
+    def test_same_text_uses_cache(self, fake_tts):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, 'cache')
+            generate_audio('Der Hund bellt.', os.path.join(tmpdir, 'a.mp3'), cache_dir=cache_dir)
+            generate_audio('Der Hund bellt.', os.path.join(tmpdir, 'b.mp3'), cache_dir=cache_dir)
+            assert fake_tts.calls == ['Der Hund bellt.']
+            assert read_bytes(os.path.join(tmpdir, 'b.mp3')) == b'Der Hund bellt.'
+
+    def test_output_is_linked_to_cache(self, fake_tts):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, 'cache')
+            out = os.path.join(tmpdir, 'a.mp3')
+            generate_audio('Hund', out, cache_dir=cache_dir)
+            cache_path = os.path.join(cache_dir, hashlib.md5(b'Hund').hexdigest() + '.mp3')
+            assert os.path.samefile(out, cache_path)
+
+    def test_audio_file_not_private(self, fake_tts):
+        """Cached mp3s get the normal umask mode, not tempfile's 0600 (audio/ links share it)."""
+        umask = os.umask(0o022)
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                out = os.path.join(tmpdir, 'a.mp3')
+                generate_audio('Hund', out, cache_dir=os.path.join(tmpdir, 'cache'))
+                assert os.stat(out).st_mode & 0o777 == 0o644
+        finally:
+            os.umask(umask)
+
+    @patch('german_anki_generator.os.link', side_effect=OSError('cross-device link'))
+    def test_copies_when_link_fails(self, mock_link, fake_tts):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out = os.path.join(tmpdir, 'a.mp3')
+            generate_audio('Hund', out, cache_dir=os.path.join(tmpdir, 'cache'))
+            assert read_bytes(out) == b'Hund'
+
+    def test_different_text_not_shared(self, fake_tts):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, 'cache')
+            generate_audio('Hund', os.path.join(tmpdir, 'a.mp3'), cache_dir=cache_dir)
+            generate_audio('Katze', os.path.join(tmpdir, 'b.mp3'), cache_dir=cache_dir)
+        assert fake_tts.calls == ['Hund', 'Katze']
+
+    @patch('german_anki_generator.time.sleep')
+    def test_retries_after_tts_error(self, mock_sleep, fake_tts):
+        fake_tts.errors = [tts_http_error(429), tts_http_error(503)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, 'cache')
+            out = os.path.join(tmpdir, 'a.mp3')
+            generate_audio('Hund', out, cache_dir=cache_dir)
+            assert read_bytes(out) == b'Hund'
+            assert os.listdir(cache_dir) == [hashlib.md5(b'Hund').hexdigest() + '.mp3']
+        assert mock_sleep.call_count == 2
+
+    @patch('german_anki_generator.time.sleep')
+    def test_gives_up_after_max_attempts(self, mock_sleep, fake_tts):
+        fake_tts.errors = [tts_http_error(429)] * TTS_MAX_ATTEMPTS
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, 'cache')
+            out = os.path.join(tmpdir, 'a.mp3')
+            with pytest.raises(gtts.gTTSError):
+                generate_audio('Hund', out, cache_dir=cache_dir)
+            assert not os.path.exists(out)
+            assert os.listdir(cache_dir) == []  # no .tmp left behind
+
+
+    @patch('german_anki_generator.time.sleep')
+    def test_connection_error_not_retried(self, mock_sleep, fake_tts):
+        """Offline, every clip would otherwise sleep through the whole backoff before failing."""
+        fake_tts.errors = [gtts.gTTSError('Failed to connect. Probable cause: Unknown')]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with pytest.raises(gtts.gTTSError):
+                generate_audio('Hund', os.path.join(tmpdir, 'a.mp3'), cache_dir=os.path.join(tmpdir, 'cache'))
+        assert fake_tts.calls == ['Hund']
+        mock_sleep.assert_not_called()
+
+    @patch('german_anki_generator.time.sleep')
+    def test_client_error_not_retried(self, mock_sleep, fake_tts):
+        fake_tts.errors = [tts_http_error(404)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with pytest.raises(gtts.gTTSError):
+                generate_audio('Hund', os.path.join(tmpdir, 'a.mp3'), cache_dir=os.path.join(tmpdir, 'cache'))
+        mock_sleep.assert_not_called()
+
+
+class TestExportDeck:
+    def test_shared_media_written_once(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            audio = os.path.join(tmpdir, 'sent_abc.mp3')
+            with open(audio, 'wb') as f:
+                f.write(b'mp3')
+            out = os.path.join(tmpdir, 'deck.apkg')
+            export_deck(make_deck(), out, [audio, audio])
+            with zipfile.ZipFile(out) as z:
+                assert sorted(z.namelist()) == ['0', 'collection.anki2', 'media']
+
+
 # ---------------------------------------------------------------------------
 # Stable GUID tests
 # ---------------------------------------------------------------------------
@@ -378,6 +596,22 @@ class TestAnkiModel:
         assert names[F_PERFEKT] == 'Perfekt'
 
 
+# ---------------------------------------------------------------------------
+# Deck ID
+# ---------------------------------------------------------------------------
+
+class TestDeckId:
+    def test_same_name_same_id(self):
+        assert deck_id_for('German Cloze') == deck_id_for('German Cloze')
+
+    def test_different_names_differ(self):
+        assert deck_id_for('German Cloze') != deck_id_for('German Vocabulary')
+
+    def test_in_anki_id_range(self):
+        for name in ('German Vocabulary', 'German Sentences', 'German Cloze', ''):
+            assert (1 << 30) <= deck_id_for(name) < (1 << 31)
+
+
 # ---------------------------------------------------------------------------
 # Sentence card mode
 # ---------------------------------------------------------------------------
@@ -530,9 +764,9 @@ class TestCreateClozeCards:
         deck = make_deck()
         with tempfile.TemporaryDirectory() as tmpdir:
             create_cloze_cards(VERB_CLOZE_INFO, model, deck, tmpdir)
-        audio_text = mock_audio.call_args_list[0].args[0]
-        assert '{{' not in audio_text
-        assert 'dreht' in audio_text
+        audio_texts = [c.args[0] for c in mock_audio.call_args_list]
+        assert all('{{' not in text for text in audio_texts)
+        assert 'Er dreht das Steuer.' in audio_texts
 
     @patch('german_anki_generator.generate_audio')
     def test_dual_reflexive_creates_notes_for_both_forms(self, mock_audio):
@@ -562,3 +796,131 @@ class TestCreateClozeCards:
     @patch('german_anki_generator.generate_audio')
     def test_cloze_model_id_is_fixed(self, mock_audio):
         assert create_cloze_model().model_id == CLOZE_MODEL_ID_CUSTOM
+
+
+# ---------------------------------------------------------------------------
+# Word lists
+# ---------------------------------------------------------------------------
+
+class TestReadWordList:
+    def test_skips_blank_and_comment_lines(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'words.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('# header\nHund\n\n  drehen  \n')
+            assert read_word_list(path) == ['Hund', 'drehen']
+
+    def test_missing_file_raises(self):
+        """Library callers get an exception; only read_words_from_file exits."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with pytest.raises(FileNotFoundError):
+                load_word_infos_for(os.path.join(tmpdir, 'missing.txt'), card_data_dir=tmpdir)
+
+
+# ---------------------------------------------------------------------------
+# build_deck
+# ---------------------------------------------------------------------------
+
+def run_build_deck(monkeypatch, word_infos, **kwargs):
+    """Save word_infos to a temporary card_data/ and build from them in order.
+
+    Returns the exported deck, or None if build_deck didn't export one.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.chdir(tmpdir)
+        for info in word_infos:
+            save_word_info(info)
+        with open('words.txt', 'w', encoding='utf-8') as f:
+            f.write(''.join(f'{info["canonical"]}\n' for info in word_infos))
+        with patch('build_deck.export_deck') as mock_export:
+            build_deck(words_file='words.txt', **kwargs)
+    return mock_export.call_args.args[0] if mock_export.called else None
+
+
+def slow_for(text_prefix):
+    """generate_audio stand-in that is slow for one word, so concurrent builds finish out of order."""
+    def fake(text, filename):
+        if text.startswith(text_prefix):
+            time.sleep(0.05)
+        return filename
+    return fake
+
+
+class TestBuildDeck:
+    @patch('german_anki_generator.generate_audio')
+    def test_notes_in_input_order(self, mock_audio, monkeypatch):
+        mock_audio.side_effect = slow_for('drehen')
+        deck = run_build_deck(monkeypatch, [VERB_INFO, NOUN_INFO, DUAL_REFLEXIVE_INFO, ADJECTIVE_INFO])
+        assert [n.fields[F_GERMAN_FRONT] for n in deck.notes] == [
+            'drehen', 'Hund', 'sich vorstellen', 'vorstellen', 'schön',
+        ]
+
+    @patch('german_anki_generator.generate_audio')
+    def test_dual_reflexive_gives_two_notes(self, mock_audio, monkeypatch):
+        mock_audio.side_effect = lambda text, filename: filename
+        deck = run_build_deck(monkeypatch, [DUAL_REFLEXIVE_INFO])
+        assert len(deck.notes) == 2
+
+    @patch('german_anki_generator.generate_audio')
+    def test_sentence_mode_order(self, mock_audio, monkeypatch):
+        mock_audio.side_effect = slow_for('Der Hund')
+        deck = run_build_deck(monkeypatch, [NOUN_INFO, ADJECTIVE_INFO], mode='sentence')
+        assert [n.fields[1] for n in deck.notes] == [
+            'Der Hund bellt laut.', 'Die Hunde spielen im Park.', 'Das ist ein schöner Tag.',
+        ]
+
+    @patch('german_anki_generator.generate_audio')
+    def test_tts_failure_writes_no_deck(self, mock_audio, monkeypatch, capsys):
+        """A deck missing words must not replace the last good one."""
+        def fake(text, filename):
+            if 'Hund' in text:
+                raise gtts.gTTSError('Failed to connect')
+            return filename
+        mock_audio.side_effect = fake
+        assert run_build_deck(monkeypatch, [VERB_INFO, NOUN_INFO, ADJECTIVE_INFO]) is None
+        out = capsys.readouterr().out
+        assert 'could not build "Hund"' in out
+        assert 'Text-to-speech failed for 1 word(s): Hund' in out
+        assert 'left unchanged' in out
+
+    @patch('build_deck.MAX_CONCURRENT_WORDS', 1)
+    @patch('german_anki_generator.generate_audio')
+    def test_tts_failure_stops_remaining_words(self, mock_audio, monkeypatch, capsys):
+        def fake(text, filename):
+            if 'Hund' in text:
+                raise gtts.gTTSError('Failed to connect')
+            return filename
+        mock_audio.side_effect = fake
+        run_build_deck(monkeypatch, [NOUN_INFO, VERB_INFO, ADJECTIVE_INFO])
+        spoken = [c.args[0] for c in mock_audio.call_args_list]
+        assert 'drehen' not in spoken and 'schön' not in spoken
+        assert '2 word(s) not attempted' in capsys.readouterr().out
+
+    @patch('german_anki_generator.generate_audio')
+    def test_disk_error_stops_the_build(self, mock_audio, monkeypatch):
+        """A full disk or unwritable audio/ won't be fixed by a re-run, so it isn't skipped."""
+        mock_audio.side_effect = PermissionError('audio/')
+        with pytest.raises(PermissionError):
+            run_build_deck(monkeypatch, [VERB_INFO])
+
+    @patch('german_anki_generator.generate_audio')
+    def test_no_notes_writes_no_deck(self, mock_audio, monkeypatch, capsys):
+        mock_audio.side_effect = lambda text, filename: filename
+        assert run_build_deck(monkeypatch, [NOUN_INFO], mode='cloze') is None
+        assert 'No cards built' in capsys.readouterr().out
+
+    @patch('german_anki_generator.generate_audio')
+    def test_bad_card_data_stops_the_build(self, mock_audio, monkeypatch, capsys):
+        """A KeyError from malformed card data is a bug, not something to skip and export around."""
+        mock_audio.side_effect = lambda text, filename: filename
+        broken = {k: v for k, v in NOUN_INFO.items() if k != 'english'}
+        with pytest.raises(KeyError):
+            run_build_deck(monkeypatch, [VERB_INFO, broken])
+        assert 'Built' not in capsys.readouterr().out
+
+    @patch('german_anki_generator.generate_audio')
+    def test_cloze_mode_skips_words_without_cloze_sentences(self, mock_audio, monkeypatch, capsys):
+        mock_audio.side_effect = lambda text, filename: filename
+        deck = run_build_deck(monkeypatch, [NOUN_INFO, VERB_CLOZE_INFO], mode='cloze')
+        assert len(deck.notes) == 3  # VERB_CLOZE_INFO's sentences only
+        assert 'no cloze_sentences for "Hund"' in capsys.readouterr().out